@@ -1,6 +1,33 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, JSON
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, Date, JSON
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+engine = create_engine(
+    "sqlite:///coach.db",
+    future=True,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.close()
 
-engine = create_engine("sqlite:///coach.db", future=True)
 SessionLocal = sessionmaker(bind=engine, future=True)
 Base = declarative_base()
+
+def get_db():
+    """FastAPI dependency: one session per request, returned to the pool after."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,50 +1,81 @@
 import os
 import time
+import asyncio
 import datetime as dt
 import secrets
+import threading
 from urllib.parse import urlencode
 import httpx
-from fastapi import FastAPI, HTTPException, Query, Body, Request
-from fastapi.responses import RedirectResponse, JSONResponse
+import orjson
+from cachetools import TTLCache
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from fastapi import FastAPI, HTTPException, Query, Body, Request, BackgroundTasks, Depends
+from fastapi.responses import RedirectResponse, JSONResponse, ORJSONResponse
 from dotenv import load_dotenv
 
 # Load .env before any other imports that use os.getenv
 load_dotenv()
 
-from db import engine, SessionLocal
-from models import Base, TokenStore, DailyRecovery, GarminActivity
+from db import engine, get_db
+from models import Base, TokenStore, SyncState, DailyRecovery, GarminActivity
 from garminconnect import (
     Garmin,
     GarminConnectConnectionError,
     GarminConnectAuthenticationError,
 )
-from rules import DailySummary, generate_plan
-from telegram_utils import send_telegram_message, format_plan_for_telegram
+from garth.exc import GarthHTTPError
+from requests import HTTPError
+from rules import load_daily_summary, generate_plan_cached
+from telegram_utils import TELEGRAM_HTTP, TELEGRAM_CHAT_ID, send_telegram_message, format_plan_for_telegram
 
 Base.metadata.create_all(bind=engine)
+# create_all skips tables that already exist, so add any newly declared
+# indexes to an existing coach.db as well.
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 WHOOP_CLIENT_ID = os.getenv("WHOOP_CLIENT_ID")
 WHOOP_CLIENT_SECRET = os.getenv("WHOOP_CLIENT_SECRET")
 WHOOP_REDIRECT_URI = os.getenv("WHOOP_REDIRECT_URI")
+GARMIN_EMAIL = os.getenv("GARMIN_EMAIL")
+GARMIN_PASSWORD = os.getenv("GARMIN_PASSWORD")
+GARMIN_TOKENSTORE = os.getenv("GARMIN_TOKENSTORE", ".garmin_session")
+BASE_URL = os.getenv("BASE_URL", "https://ai-coach-production-6b35.up.railway.app")
+
+WHOOP_HTTP = httpx.Client(
+    base_url="https://api.prod.whoop.com",
+    timeout=30,
+    limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+)
+WHOOP_API = httpx.AsyncClient(
+    base_url="https://api.prod.whoop.com/developer/v2",
+    timeout=30,
+    limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+)
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
-STATE_STORE = {}
+@app.on_event("shutdown")
+async def _close_http_clients():
+    WHOOP_HTTP.close()
+    await WHOOP_API.aclose()
+    TELEGRAM_HTTP.close()
+
+# Pending OAuth states expire after 10 minutes; abandoned flows are evicted.
+STATE_STORE = TTLCache(maxsize=1024, ttl=600)
 
 def make_state():
     s = secrets.token_urlsafe(16)
-    STATE_STORE[s] = int(time.time()) + 600
+    STATE_STORE[s] = True
     return s
 
 def validate_state(s: str):
-    exp = STATE_STORE.get(s)
-    if not exp:
-        return False
-    if time.time() > exp:
-        STATE_STORE.pop(s, None)
-        return False
-    STATE_STORE.pop(s, None)
-    return True
+    return STATE_STORE.pop(s, None) is not None
+
+# (access_token, expires_at) of the last token seen, so valid tokens skip the DB.
+_TOKEN_CACHE: tuple[str, int] | None = None
 
 @app.get("/auth/whoop/start")
 def whoop_start():
@@ -65,6 +96,7 @@ def whoop_callback(
     state: str | None = Query(default=None),
     error: str | None = Query(default=None),
     error_description: str | None = Query(default=None),
+    db: Session = Depends(get_db),
 ):
     if error:
         return JSONResponse(
@@ -76,7 +108,6 @@ def whoop_callback(
     if not validate_state(state):
         raise HTTPException(400, "Invalid or expired state")
 
-    token_url = "https://api.prod.whoop.com/oauth/oauth2/token"
     data = {
         "grant_type": "authorization_code",
         "code": code,
@@ -84,61 +115,146 @@ def whoop_callback(
         "client_id": WHOOP_CLIENT_ID,
         "client_secret": WHOOP_CLIENT_SECRET
     }
-    with httpx.Client(timeout=15) as client:
-        r = client.post(token_url, data=data)
-        r.raise_for_status()
-        tok = r.json()
+    r = WHOOP_HTTP.post("/oauth/oauth2/token", data=data, timeout=15)
+    r.raise_for_status()
+    tok = r.json()
 
     expires_at = int(time.time()) + tok["expires_in"]
 
-    db = SessionLocal()
-    row = db.query(TokenStore).filter_by(provider="whoop").one_or_none()
-    if not row:
-        row = TokenStore(provider="whoop")
-    row.access_token = tok["access_token"]
-    row.refresh_token = tok["refresh_token"]
-    row.expires_at = expires_at
-    db.add(row)
+    stmt = sqlite_insert(TokenStore).values(
+        provider="whoop",
+        access_token=tok["access_token"],
+        refresh_token=tok["refresh_token"],
+        expires_at=expires_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["provider"],
+        set_={
+            "access_token": stmt.excluded.access_token,
+            "refresh_token": stmt.excluded.refresh_token,
+            "expires_at": stmt.excluded.expires_at,
+        },
+    )
+    db.execute(stmt)
     db.commit()
+
+    global _TOKEN_CACHE
+    _TOKEN_CACHE = (tok["access_token"], expires_at)
     return JSONResponse({"status": "whoop connected"})
 
 def get_valid_token(db):
+    global _TOKEN_CACHE
+    if _TOKEN_CACHE and time.time() < _TOKEN_CACHE[1] - 60:
+        return _TOKEN_CACHE[0]
+
     row = db.query(TokenStore).filter_by(provider="whoop").one_or_none()
     if not row:
         raise HTTPException(400, "Whoop not connected")
     if time.time() < row.expires_at - 60:
+        _TOKEN_CACHE = (row.access_token, row.expires_at)
         return row.access_token
 
-    token_url = "https://api.prod.whoop.com/oauth/oauth2/token"
     data = {
         "grant_type": "refresh_token",
         "refresh_token": row.refresh_token,
         "client_id": WHOOP_CLIENT_ID,
         "client_secret": WHOOP_CLIENT_SECRET
     }
-    with httpx.Client(timeout=15) as client:
-        r = client.post(token_url, data=data)
-        r.raise_for_status()
-        tok = r.json()
+    r = WHOOP_HTTP.post("/oauth/oauth2/token", data=data, timeout=15)
+    if r.is_error:
+        _TOKEN_CACHE = None
+    r.raise_for_status()
+    tok = r.json()
     row.access_token = tok["access_token"]
     row.refresh_token = tok.get("refresh_token", row.refresh_token)
     row.expires_at = int(time.time()) + tok["expires_in"]
     db.add(row); db.commit()
+    _TOKEN_CACHE = (row.access_token, row.expires_at)
     return row.access_token
 
+async def whoop_get_json(path: str, headers: dict, params: dict | None = None) -> dict:
+    r = await WHOOP_API.get(path, params=params, headers=headers)
+    return orjson.loads(r.content) if r.status_code == 200 else {}
+
+# Repeated sync calls within SYNC_DEBOUNCE_S get the previous result instead
+# of hitting the rate-limited upstream again; the locks coalesce concurrent calls.
+SYNC_DEBOUNCE_S = 30
+_LAST_SYNC: dict[str, tuple[float, dict]] = {}
+_WHOOP_SYNC_LOCK = asyncio.Lock()
+_GARMIN_SYNC_LOCK = threading.Lock()
+
+def recent_sync(provider: str) -> dict | None:
+    hit = _LAST_SYNC.get(provider)
+    if hit and time.time() - hit[0] < SYNC_DEBOUNCE_S:
+        return hit[1]
+    return None
+
 @app.post("/whoop/sync")
-def whoop_sync():
-    db = SessionLocal()
-    token = get_valid_token(db)
+async def whoop_sync(db: Session = Depends(get_db)):
+    async with _WHOOP_SYNC_LOCK:
+        result = recent_sync("whoop")
+        if result is None:
+            result = await run_whoop_sync(db)
+            _LAST_SYNC["whoop"] = (time.time(), result)
+        return result
+
+def load_recovery_validators(db: Session) -> tuple[str | None, str | None]:
+    state = db.query(SyncState).filter_by(name="whoop_recovery").one_or_none()
+    if not state:
+        return None, None
+    return state.etag, state.last_modified
+
+def save_whoop_sync(db: Session, recovery: dict, validators: tuple[str | None, str | None] | None):
+    stmt = sqlite_insert(DailyRecovery).values(**recovery)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["date"],
+        set_={
+            "hrv_ms": stmt.excluded.hrv_ms,
+            "rhr_bpm": stmt.excluded.rhr_bpm,
+            "sleep_min": stmt.excluded.sleep_min,
+            "temp_delta": stmt.excluded.temp_delta,
+            "raw": stmt.excluded.raw,
+        },
+    )
+    db.execute(stmt)
+
+    if validators is not None:
+        etag, last_modified = validators
+        stmt = sqlite_insert(SyncState).values(
+            name="whoop_recovery",
+            etag=etag,
+            last_modified=last_modified,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={
+                "etag": stmt.excluded.etag,
+                "last_modified": stmt.excluded.last_modified,
+            },
+        )
+        db.execute(stmt)
+    db.commit()
+
+async def run_whoop_sync(db: Session) -> dict:
+    # DB work runs in a worker thread so a locked SQLite write never stalls the event loop.
+    token = await asyncio.to_thread(get_valid_token, db)
     headers = {"Authorization": f"Bearer {token}"}
 
-    with httpx.Client(timeout=30) as client:
-        rec = client.get(
-            "https://api.prod.whoop.com/developer/v2/recovery",
-            params={"limit": 1, "order": "desc"},
-            headers=headers
-        )
-        rec_json = rec.json() if rec.status_code == 200 else {}
+    # Conditional GET: an unchanged latest recovery comes back as 304.
+    etag, last_modified = await asyncio.to_thread(load_recovery_validators, db)
+    rec_headers = dict(headers)
+    if etag:
+        rec_headers["If-None-Match"] = etag
+    if last_modified:
+        rec_headers["If-Modified-Since"] = last_modified
+    rec = await WHOOP_API.get(
+        "/recovery",
+        params={"limit": 1, "order": "desc"},
+        headers=rec_headers,
+    )
+    if rec.status_code == 304:
+        return {"status": "unchanged"}
+    rec_json = orjson.loads(rec.content) if rec.status_code == 200 else {}
 
     r0 = None
     if isinstance(rec_json, dict) and rec_json.get("records"):
@@ -163,42 +279,23 @@ def whoop_sync():
             except Exception:
                 pass
 
-    sleep_json = {}
+    # Sleep by id and the latest sleep are fetched concurrently; the by-id
+    # record wins when present.
+    lookups = [whoop_get_json("/sleep", headers, params={"limit": 1, "order": "desc"})]
     if sleep_id:
-        with httpx.Client(timeout=30) as client:
-            slp_by_id = client.get(
-                f"https://api.prod.whoop.com/developer/v2/sleep/{sleep_id}",
-                headers=headers
-            )
-            if slp_by_id.status_code == 200:
-                sleep_json = slp_by_id.json()
-            elif slp_by_id.status_code == 404:
-                sleep_json = {}
-            else:
-                sleep_json = {}
-
-    if not sleep_json:
-        with httpx.Client(timeout=30) as client:
-            slp = client.get(
-                "https://api.prod.whoop.com/developer/v2/sleep",
-                params={"limit": 1, "order": "desc"},
-                headers=headers
-            )
-            if slp.status_code == 200:
-                sleep_json = slp.json()
+        lookups.insert(0, whoop_get_json(f"/sleep/{sleep_id}", headers))
+    results = await asyncio.gather(*lookups, return_exceptions=True)
+    sleep_json = next((r for r in results if isinstance(r, dict) and r), {})
 
     if not sleep_json:
         today = dt.date.today()
         start_dt = dt.datetime.combine(today - dt.timedelta(days=3), dt.time.min).isoformat() + "Z"
         end_dt = dt.datetime.combine(today + dt.timedelta(days=1), dt.time.min).isoformat() + "Z"
-        with httpx.Client(timeout=30) as client:
-            slp2 = client.get(
-                "https://api.prod.whoop.com/developer/v2/sleep",
-                params={"start": start_dt, "end": end_dt},
-                headers=headers
-            )
-            if slp2.status_code == 200:
-                sleep_json = slp2.json()
+        sleep_json = await whoop_get_json(
+            "/sleep",
+            headers,
+            params={"start": start_dt, "end": end_dt},
+        )
 
     sleep_min = 0
     def extract_sleep_minutes(record: dict) -> int:
@@ -221,15 +318,23 @@ def whoop_sync():
     elif isinstance(sleep_json, dict) and sleep_json:
         sleep_min = extract_sleep_minutes(sleep_json)
 
-    row = db.query(DailyRecovery).filter_by(date=rec_date).one_or_none()
-    if not row:
-        row = DailyRecovery(date=rec_date)
-    row.hrv_ms = hrv_ms
-    row.rhr_bpm = rhr_bpm
-    row.sleep_min = sleep_min
-    row.temp_delta = temp_delta
-    row.raw = {"recovery": rec_json, "sleep": sleep_json}
-    db.add(row); db.commit()
+    recovery = dict(
+        date=rec_date,
+        hrv_ms=hrv_ms,
+        rhr_bpm=rhr_bpm,
+        sleep_min=sleep_min,
+        temp_delta=temp_delta,
+        raw={"recovery": rec_json, "sleep": sleep_json},
+    )
+    validators = None
+    if rec.status_code == 200:
+        # Only trust a 304 later if this sync also got the sleep data;
+        # otherwise clear the validators so the next sync refetches everything.
+        if sleep_json:
+            validators = (rec.headers.get("ETag"), rec.headers.get("Last-Modified"))
+        else:
+            validators = (None, None)
+    await asyncio.to_thread(save_whoop_sync, db, recovery, validators)
 
     return {
         "status": "ok",
@@ -245,25 +350,80 @@ def safe_float(val):
     except (TypeError, ValueError):
         return None
 
+_GARMIN_CLIENT = None
+_GARMIN_LOCK = threading.Lock()
+
+def _garth_auth_rejected(e: GarthHTTPError | HTTPError) -> bool:
+    # garth wraps API errors in GarthHTTPError, but an OAuth2 refresh
+    # (garth.sso.exchange) raises the bare requests.HTTPError.
+    error = e.error if isinstance(e, GarthHTTPError) else e
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in (401, 403)
+
+def _garmin_sso_login(client):
+    client.login()
+    client.garth.dump(GARMIN_TOKENSTORE)
+
+def get_garmin_client(fresh: bool = False):
+    """Logged-in Garmin client, reusing the session saved in GARMIN_TOKENSTORE.
+
+    fresh=True skips the saved tokens and does a full SSO login.
+    """
+    global _GARMIN_CLIENT
+    with _GARMIN_LOCK:
+        if _GARMIN_CLIENT is None or fresh:
+            client = Garmin(GARMIN_EMAIL, GARMIN_PASSWORD)
+            if fresh:
+                _garmin_sso_login(client)
+            else:
+                try:
+                    client.login(GARMIN_TOKENSTORE)
+                except (FileNotFoundError, GarthHTTPError, HTTPError) as e:
+                    # Only missing or rejected tokens justify a full SSO login;
+                    # rate limits and other upstream errors propagate.
+                    if not isinstance(e, FileNotFoundError) and not _garth_auth_rejected(e):
+                        raise
+                    _garmin_sso_login(client)
+            _GARMIN_CLIENT = client
+        return _GARMIN_CLIENT
+
+def reset_garmin_client():
+    global _GARMIN_CLIENT
+    with _GARMIN_LOCK:
+        _GARMIN_CLIENT = None
+
 @app.post("/garmin/sync")
-def garmin_sync():
-    email = os.getenv("GARMIN_EMAIL")
-    password = os.getenv("GARMIN_PASSWORD")
-    db = SessionLocal()
+def garmin_sync(db: Session = Depends(get_db)):
+    with _GARMIN_SYNC_LOCK:
+        result = recent_sync("garmin")
+        if result is None:
+            result = run_garmin_sync(db)
+            _LAST_SYNC["garmin"] = (time.time(), result)
+        return result
+
+def run_garmin_sync(db: Session) -> dict:
     try:
-        client = Garmin(email, password)
-        client.login()
+        client = get_garmin_client()
     except (GarminConnectConnectionError, GarminConnectAuthenticationError) as e:
         raise HTTPException(400, f"Garmin login failed: {e}")
 
-    activities = client.get_activities(0, 10)
-    new_activities = 0
-    for act in activities:
-        act_id = str(act["activityId"])
-        if db.query(GarminActivity).filter_by(activity_id=act_id).first():
-            continue
-        ga = GarminActivity(
-            activity_id=act_id,
+    try:
+        activities = client.get_activities(0, 10)
+    except (GarthHTTPError, HTTPError) as e:
+        if not _garth_auth_rejected(e):
+            raise
+        # The cached session was rejected: log in again via SSO and retry once.
+        reset_garmin_client()
+        try:
+            activities = get_garmin_client(fresh=True).get_activities(0, 10)
+        except (GarthHTTPError, HTTPError) as e:
+            if not _garth_auth_rejected(e):
+                raise
+            reset_garmin_client()
+            raise HTTPException(400, f"Garmin session expired: {e}")
+    rows = [
+        dict(
+            activity_id=str(act["activityId"]),
             start_time=dt.datetime.fromisoformat(act["startTimeLocal"]),
             sport=act.get("activityType", {}).get("typeKey"),
             duration_s=safe_float(act.get("duration")),
@@ -274,82 +434,55 @@ def garmin_sync():
             vo2max=safe_float(act.get("vo2MaxValue")),
             summary_json=act,
         )
-        db.add(ga)
-        new_activities += 1
-    db.commit()
+        for act in activities
+    ]
+    new_activities = 0
+    if rows:
+        stmt = sqlite_insert(GarminActivity).values(rows).on_conflict_do_nothing(
+            index_elements=["activity_id"]
+        )
+        new_activities = db.execute(stmt).rowcount
+        db.commit()
     return {"status": "ok", "new_activities": new_activities}
 
 @app.post("/api/trigger")
-def trigger_plan(payload: dict = Body(default={})):
-    db = SessionLocal()
-    today = dt.date.today()
-    daily_rec = db.query(DailyRecovery).filter_by(date=today).first()
-
-    seven_days_ago = today - dt.timedelta(days=7)
-    garmin_activities = db.query(GarminActivity).filter(GarminActivity.start_time >= seven_days_ago).all()
-    garmin_load_7d = sum([a.training_load or 0 for a in garmin_activities]) if garmin_activities else 0
-
-    hrv_records = db.query(DailyRecovery).filter(DailyRecovery.hrv_ms != None).order_by(DailyRecovery.date.desc()).limit(7).all()
-    avg7_hrv = sum([r.hrv_ms for r in hrv_records]) / len(hrv_records) if hrv_records else None
-
-    rhr_records = db.query(DailyRecovery).filter(DailyRecovery.rhr_bpm != None).order_by(DailyRecovery.date.desc()).limit(7).all()
-    avg7_rhr = sum([r.rhr_bpm for r in rhr_records]) / len(rhr_records) if rhr_records else None
-
-    sleep_min = None
-    if daily_rec and daily_rec.sleep_min and daily_rec.sleep_min > 0:
-        sleep_min = daily_rec.sleep_min
-    elif "manual_sleep_min" in payload:
-        sleep_min = int(payload["manual_sleep_min"])
-    else:
-        sleep_min = None
-
-    cycle_phase = payload.get("cycle_phase") or None
-
-    daily = DailySummary(
-        date=str(today),
-        hrv_ms=daily_rec.hrv_ms if daily_rec else None,
-        rhr_bpm=daily_rec.rhr_bpm if daily_rec else None,
-        sleep_min=sleep_min,
-        temp_delta=daily_rec.temp_delta if daily_rec else None,
-        load_7d=garmin_load_7d,
-        avg7_hrv_ms=avg7_hrv,
-        avg7_rhr_bpm=avg7_rhr,
-        cycle_phase=cycle_phase,
-        context=payload.get("context", []),
-        time_min=int(payload.get("time_min", 30)),
-    )
-
-    plan = generate_plan(daily)
+def trigger_plan(
+    background: BackgroundTasks,
+    payload: dict = Body(default={}),
+    db: Session = Depends(get_db),
+):
+    daily = load_daily_summary(db, dt.date.today(), payload)
+    plan = generate_plan_cached(daily)
     msg = format_plan_for_telegram(plan)
-    send_telegram_message(msg)
+    background.add_task(send_telegram_message, msg)
     return plan
 
 @app.post("/telegram/webhook")
-async def telegram_webhook(request: Request):
+async def telegram_webhook(
+    request: Request,
+    background: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     import requests
-    import threading
 
-    data = await request.json()
+    data = orjson.loads(await request.body())
     message = data.get("message", {})
     chat_id = str(message.get("chat", {}).get("id"))
     text = message.get("text", "").strip().lower()
 
     # Only respond to your own chat
-    if chat_id != os.getenv("TELEGRAM_CHAT_ID"):
+    if chat_id != TELEGRAM_CHAT_ID:
         return {"ok": True}
 
-    db = SessionLocal()
     today = dt.date.today()
 
     # SYNC command (now runs in background)
     if text == "sync":
-        send_telegram_message("Sync started! I'll let you know when it's done.")
-
         def do_sync():
-            base_url = os.getenv("BASE_URL", "https://ai-coach-production-6b35.up.railway.app")
+            send_telegram_message("Sync started! I'll let you know when it's done.")
             try:
-                whoop_resp = requests.post(f"{base_url}/whoop/sync", timeout=60)
-                garmin_resp = requests.post(f"{base_url}/garmin/sync", timeout=60)
+                whoop_resp = requests.post(f"{BASE_URL}/whoop/sync", timeout=60)
+                garmin_resp = requests.post(f"{BASE_URL}/garmin/sync", timeout=60)
                 send_telegram_message("Data synced! Now send 'plan' to get your updated plan.")
             except Exception as e:
                 send_telegram_message(f"Sync failed: {e}")
@@ -371,11 +504,11 @@ async def telegram_webhook(request: Request):
                 row.sleep_min = minutes
                 db.add(row)
                 db.commit()
-                send_telegram_message(f"Logged sleep: {minutes} min")
+                background.add_task(send_telegram_message, f"Logged sleep: {minutes} min")
             except Exception:
-                send_telegram_message("Couldn't parse sleep amount. Try 'log sleep 7.5h'")
+                background.add_task(send_telegram_message, "Couldn't parse sleep amount. Try 'log sleep 7.5h'")
         else:
-            send_telegram_message("Usage: log sleep 7.5h")
+            background.add_task(send_telegram_message, "Usage: log sleep 7.5h")
     elif text.startswith("cycle phase"):
         # Example: "cycle phase late_luteal"
         parts = text.split()
@@ -389,39 +522,16 @@ async def telegram_webhook(request: Request):
             row.raw["cycle_phase"] = phase
             db.add(row)
             db.commit()
-            send_telegram_message(f"Cycle phase updated to: {phase}")
+            background.add_task(send_telegram_message, f"Cycle phase updated to: {phase}")
         else:
-            send_telegram_message("Usage: cycle phase late_luteal")
+            background.add_task(send_telegram_message, "Usage: cycle phase late_luteal")
     elif text in ["plan", "summary"]:
         # Generate or fetch today's plan
-        payload = {}  # You can add more context if needed
-        daily_rec = db.query(DailyRecovery).filter_by(date=today).first()
-        seven_days_ago = today - dt.timedelta(days=7)
-        garmin_activities = db.query(GarminActivity).filter(GarminActivity.start_time >= seven_days_ago).all()
-        garmin_load_7d = sum([a.training_load or 0 for a in garmin_activities]) if garmin_activities else 0
-        hrv_records = db.query(DailyRecovery).filter(DailyRecovery.hrv_ms != None).order_by(DailyRecovery.date.desc()).limit(7).all()
-        avg7_hrv = sum([r.hrv_ms for r in hrv_records]) / len(hrv_records) if hrv_records else None
-        rhr_records = db.query(DailyRecovery).filter(DailyRecovery.rhr_bpm != None).order_by(DailyRecovery.date.desc()).limit(7).all()
-        avg7_rhr = sum([r.rhr_bpm for r in rhr_records]) / len(rhr_records) if rhr_records else None
-        sleep_min = daily_rec.sleep_min if daily_rec and daily_rec.sleep_min else None
-        cycle_phase = daily_rec.raw.get("cycle_phase") if daily_rec and daily_rec.raw else None
-        daily = DailySummary(
-            date=str(today),
-            hrv_ms=daily_rec.hrv_ms if daily_rec else None,
-            rhr_bpm=daily_rec.rhr_bpm if daily_rec else None,
-            sleep_min=sleep_min,
-            temp_delta=daily_rec.temp_delta if daily_rec else None,
-            load_7d=garmin_load_7d,
-            avg7_hrv_ms=avg7_hrv,
-            avg7_rhr_bpm=avg7_rhr,
-            cycle_phase=cycle_phase,
-            context=[],
-            time_min=30,
-        )
-        plan = generate_plan(daily)
+        daily = load_daily_summary(db, today, {})
+        plan = generate_plan_cached(daily)
         msg = format_plan_for_telegram(plan)
-        send_telegram_message(msg)
+        background.add_task(send_telegram_message, msg)
     else:
-        send_telegram_message("Commands: sync, log sleep [hours], cycle phase [phase], plan, summary")
+        background.add_task(send_telegram_message, "Commands: sync, log sleep [hours], cycle phase [phase], plan, summary")
 
     return {"ok": True}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, JSON, Index
 from db import Base
 
 class TokenStore(Base):
@@ -9,6 +9,13 @@ class TokenStore(Base):
     refresh_token = Column(String)
     expires_at = Column(Integer)  # epoch seconds
 
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True)  # "whoop_recovery"
+    etag = Column(String)
+    last_modified = Column(String)  # raw Last-Modified header
+
 class DailyRecovery(Base):
     __tablename__ = "daily_recovery"
     id = Column(Integer, primary_key=True)
@@ -18,12 +25,14 @@ class DailyRecovery(Base):
     sleep_min = Column(Integer)
     temp_delta = Column(Float)
     raw = Column(JSON)  # store full JSON for traceability
+
+    __table_args__ = (Index("ix_dr_date_desc", date.desc()),)
     
 class GarminActivity(Base):
     __tablename__ = "garmin_activities"
     id = Column(Integer, primary_key=True)
     activity_id = Column(String, unique=True)
-    start_time = Column(DateTime)
+    start_time = Column(DateTime, index=True)
     sport = Column(String)
     duration_s = Column(Float)
     distance_m = Column(Float)
@@ -1,6 +1,12 @@
 # rules.py
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional, Tuple
+import datetime as dt
+
+from sqlalchemy import select, func, or_
+from models import DailyRecovery, GarminActivity
 
 @dataclass
 class DailySummary:
@@ -55,64 +61,74 @@ def _pick_focus(flags: Dict[str, bool], cycle_phase: Optional[str]) -> str:
     # Default consolidation
     return "Aerobic Base / Skills"
 
-def _short_session_blocks(focus: str, time_min: int, context: List[str]) -> List[Dict[str, Any]]:
-    # Minimal blocks that fit available time
-    # Renovation day = avoid heavy legs
-    reno = "renovation" in context
+def _frozen(*blocks: Dict[str, Any]) -> Tuple[Mapping[str, Any], ...]:
+    return tuple(MappingProxyType({**b, "content": tuple(b["content"])}) for b in blocks)
 
-    if time_min <= 15:
-        if focus == "Recovery / Deload":
-            return [
-                {"name":"Mobility", "duration_min":8, "content":["hips","t-spine","calves"]},
-                {"name":"Core", "duration_min":5, "content":["side plank 2×30″ each","dead-bug 2×8"]},
-            ]
-        elif focus == "Speed / Strength" and not reno:
-            return [
-                {"name":"Accel", "duration_min":10, "content":["boots: 3×20 m accel (full rec)","2×20 m strides"]},
-                {"name":"Core", "duration_min":5, "content":["pallof press 2×8 each"]},
-            ]
-        else:
-            return [
-                {"name":"Z2 brisk walk", "duration_min":12, "content":["RPE 3–4"]},
-            ]
-
-    if time_min <= 30:
-        if focus == "Recovery / Deload":
-            return [
-                {"name":"Mobility", "duration_min":8, "content":["hips","t-spine","calves"]},
-                {"name":"Technique", "duration_min":10, "content":["wall drill A/B","4×20 m strides (boots)"]},
-                {"name":"Core", "duration_min":5, "content":["side plank 3×30″ each"]},
-            ]
-        elif focus == "Speed / Strength" and not reno:
-            return [
-                {"name":"Accel + Plyo", "duration_min":12, "content":["boots: 4×20 m accel","broad jump 3×4"]},
-                {"name":"Strength (at-home)", "duration_min":10, "content":["backpack split squat 3×8-e"]},
-                {"name":"Core", "duration_min":5, "content":["dead-bug 3×8"]},
-            ]
-        else:
-            return [
-                {"name":"Z2 run / bike", "duration_min":20, "content":["HR < 75% max"]},
-                {"name":"Mobility", "duration_min":8, "content":["hips","glutes"]},
-            ]
-
-    # 45–60 min window
-    if focus == "Recovery / Deload":
-        return [
+# Session templates by time window (<=15, <=30, 45–60 min) and focus;
+# None is the default (aerobic base, or speed/strength on renovation days).
+_SESSION_BLOCKS: Dict[int, Dict[Optional[str], Tuple[Mapping[str, Any], ...]]] = {
+    15: {
+        "Recovery / Deload": _frozen(
+            {"name":"Mobility", "duration_min":8, "content":["hips","t-spine","calves"]},
+            {"name":"Core", "duration_min":5, "content":["side plank 2×30″ each","dead-bug 2×8"]},
+        ),
+        "Speed / Strength": _frozen(
+            {"name":"Accel", "duration_min":10, "content":["boots: 3×20 m accel (full rec)","2×20 m strides"]},
+            {"name":"Core", "duration_min":5, "content":["pallof press 2×8 each"]},
+        ),
+        None: _frozen(
+            {"name":"Z2 brisk walk", "duration_min":12, "content":["RPE 3–4"]},
+        ),
+    },
+    30: {
+        "Recovery / Deload": _frozen(
+            {"name":"Mobility", "duration_min":8, "content":["hips","t-spine","calves"]},
+            {"name":"Technique", "duration_min":10, "content":["wall drill A/B","4×20 m strides (boots)"]},
+            {"name":"Core", "duration_min":5, "content":["side plank 3×30″ each"]},
+        ),
+        "Speed / Strength": _frozen(
+            {"name":"Accel + Plyo", "duration_min":12, "content":["boots: 4×20 m accel","broad jump 3×4"]},
+            {"name":"Strength (at-home)", "duration_min":10, "content":["backpack split squat 3×8-e"]},
+            {"name":"Core", "duration_min":5, "content":["dead-bug 3×8"]},
+        ),
+        None: _frozen(
+            {"name":"Z2 run / bike", "duration_min":20, "content":["HR < 75% max"]},
+            {"name":"Mobility", "duration_min":8, "content":["hips","glutes"]},
+        ),
+    },
+    60: {
+        "Recovery / Deload": _frozen(
             {"name":"Z2 run / bike", "duration_min":25, "content":["HR < 75% max"]},
             {"name":"Mobility", "duration_min":10, "content":["full lower + t-spine"]},
             {"name":"Core", "duration_min":10, "content":["side plank 3×30″","dead-bug 3×10"]},
-        ]
-    elif focus == "Speed / Strength" and not reno:
-        return [
+        ),
+        "Speed / Strength": _frozen(
             {"name":"Accel + Plyo", "duration_min":15, "content":["boots: 4×20 m accel","fly 2×20 m","broad jump 3×3"]},
             {"name":"Strength (at-home)", "duration_min":20, "content":["backpack front squat 4×6","single-leg RDL 3×8-e"]},
             {"name":"Core", "duration_min":8, "content":["pallof press 3×8-e"]},
-        ]
-    else:
-        return [
+        ),
+        None: _frozen(
             {"name":"Z2 long", "duration_min":35, "content":["HR < 75% max"]},
             {"name":"Technique", "duration_min":10, "content":["passing / ball-handling (trainers)"]},
-        ]
+        ),
+    },
+}
+
+def _short_session_blocks(focus: str, time_min: int, context: List[str]) -> Tuple[Mapping[str, Any], ...]:
+    # Minimal blocks that fit available time
+    # Renovation day = avoid heavy legs
+    reno = "renovation" in context
+
+    if time_min <= 15:
+        tier = 15
+    elif time_min <= 30:
+        tier = 30
+    else:
+        tier = 60
+    if focus == "Speed / Strength" and reno:
+        focus = None
+    blocks = _SESSION_BLOCKS[tier]
+    return blocks.get(focus, blocks[None])
 
 def generate_plan(s: DailySummary) -> Dict[str, Any]:
     flags = compute_flags(s)
@@ -141,3 +157,94 @@ def generate_plan(s: DailySummary) -> Dict[str, Any]:
         "cycle_note": cycle_note,
         "notes": "Session adapted to time and context; avoid stacking two hard days."
     }
+
+@lru_cache(maxsize=32)
+def _cached_plan(key: tuple) -> Dict[str, Any]:
+    (date, hrv_ms, rhr_bpm, sleep_min, temp_delta, load_7d,
+     avg7_hrv_ms, avg7_rhr_bpm, cycle_phase, time_min, reno) = key
+    return generate_plan(DailySummary(
+        date=date,
+        hrv_ms=hrv_ms,
+        rhr_bpm=rhr_bpm,
+        sleep_min=sleep_min,
+        temp_delta=temp_delta,
+        load_7d=load_7d,
+        avg7_hrv_ms=avg7_hrv_ms,
+        avg7_rhr_bpm=avg7_rhr_bpm,
+        cycle_phase=cycle_phase,
+        context=["renovation"] if reno else [],
+        time_min=time_min,
+    ))
+
+def generate_plan_cached(s: DailySummary) -> Dict[str, Any]:
+    # generate_plan is pure, so identical summaries share one plan.
+    # The returned dict is shared between callers and must not be mutated.
+    # context only matters through the renovation check, so the key holds
+    # that flag instead of the (possibly unhashable) payload container.
+    key = (
+        s.date, s.hrv_ms, s.rhr_bpm, s.sleep_min, s.temp_delta, s.load_7d,
+        s.avg7_hrv_ms, s.avg7_rhr_bpm, s.cycle_phase, s.time_min,
+        "renovation" in s.context,
+    )
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable payload values (e.g. a dict cycle_phase): skip the cache.
+        return generate_plan(s)
+    return _cached_plan(key)
+
+def load_daily_summary(db, today: dt.date, payload: Dict[str, Any]) -> DailySummary:
+    cutoff = dt.datetime.combine(today - dt.timedelta(days=7), dt.time.min)
+    load_7d = (
+        select(func.coalesce(func.sum(GarminActivity.training_load), 0))
+        .where(GarminActivity.start_time >= cutoff)
+        .scalar_subquery()
+    )
+    # One scan of the 7 latest recovery rows feeds both averages; AVG skips NULLs.
+    last7 = (
+        select(DailyRecovery.hrv_ms, DailyRecovery.rhr_bpm)
+        .where(or_(DailyRecovery.hrv_ms.is_not(None), DailyRecovery.rhr_bpm.is_not(None)))
+        .order_by(DailyRecovery.date.desc())
+        .limit(7)
+        .subquery()
+    )
+    avg7 = select(
+        func.avg(last7.c.hrv_ms).label("hrv"),
+        func.avg(last7.c.rhr_bpm).label("rhr"),
+    ).subquery()
+    stmt = (
+        select(
+            DailyRecovery.hrv_ms,
+            DailyRecovery.rhr_bpm,
+            DailyRecovery.sleep_min,
+            DailyRecovery.temp_delta,
+            DailyRecovery.raw["cycle_phase"].as_string().label("cycle_phase"),
+            load_7d.label("load_7d"),
+            avg7.c.hrv.label("avg7_hrv"),
+            avg7.c.rhr.label("avg7_rhr"),
+        )
+        .select_from(avg7)
+        .outerjoin(DailyRecovery, DailyRecovery.date == today)
+    )
+    row = db.execute(stmt).one()
+
+    if row.sleep_min and row.sleep_min > 0:
+        sleep_min = row.sleep_min
+    elif "manual_sleep_min" in payload:
+        sleep_min = int(payload["manual_sleep_min"])
+    else:
+        sleep_min = None
+
+    return DailySummary(
+        date=str(today),
+        hrv_ms=row.hrv_ms,
+        rhr_bpm=row.rhr_bpm,
+        sleep_min=sleep_min,
+        temp_delta=row.temp_delta,
+        load_7d=row.load_7d,
+        avg7_hrv_ms=row.avg7_hrv,
+        avg7_rhr_bpm=row.avg7_rhr,
+        cycle_phase=payload.get("cycle_phase") or row.cycle_phase,
+        context=payload.get("context", []),
+        time_min=int(payload.get("time_min", 30)),
+    )